@@ -1,16 +1,17 @@
 from collections import defaultdict
 from dialogue_utils import get_dialogue_intents
-from typing import Dict, Set, Tuple, List, Optional, Callable
+from functools import lru_cache, partial
+from typing import Dict, FrozenSet, Set, Tuple, List, Optional, Callable
 from typing_extensions import Literal
 from data_utils import (
     get_filenames,
-    corpus_iterator,
     schema_iterator,
     file_iterator,
-    split_iterator,
     dialogue_iterator,
-    dial_sort_key,
-    alphabetical_sort_key,
+    field_iterator,
+    get_file_columns,
+    parallel_corpus_map,
+    sort_dialogue_ids,
     dial_files_sort_key,
 )
 
@@ -20,8 +21,11 @@ import json
 import os
 import subprocess
 
+import numpy as np
+
 
 _SPLIT_NAMES = ['train', 'dev', 'test']  # type: List[Literal['train'], Literal['dev'], Literal['test'] ]
+_DIALOGUE_TYPES = ['transactional', 'search', 'mixed_intent']
 
 
 def cast_vals_to_sorted_list(d: dict, sort_by: Optional[Callable] = None) -> dict:
@@ -31,23 +35,50 @@ def cast_vals_to_sorted_list(d: dict, sort_by: Optional[Callable] = None) -> dic
     ----------
     d
     sort_by:
-        A callable to be used as sorting key.
+        A callable to be used as sorting key, at all nesting levels.
     """
-    for key, value in d.items():
-        if isinstance(value, dict):
-            cast_vals_to_sorted_list(value)
-        else:
-            d[key] = sorted(list(value), key=sort_by)
+    stack = [d]
+    while stack:
+        node = stack.pop()
+        for key, value in node.items():
+            if isinstance(value, dict):
+                stack.append(value)
+            else:
+                node[key] = sorted(value, key=sort_by)
 
     return d
 
 
 def get_commit_hash():
-    """Returns the commit hash for the current HEAD."""
+    """Returns the commit hash for the current HEAD. The hash is read from the ``.git`` directory
+    next to this module, falling back to ``git rev-parse HEAD`` if that fails (e.g., in worktrees).
+    """
+
+    git_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.git')
+    try:
+        with open(os.path.join(git_dir, 'HEAD'), 'r') as f:
+            head = f.read().strip()
+        # detached HEAD
+        if not head.startswith('ref: '):
+            return head
+        ref = head[len('ref: '):]
+        ref_path = os.path.join(git_dir, ref)
+        if os.path.isfile(ref_path):
+            with open(ref_path, 'r') as f:
+                return f.read().strip()
+        with open(os.path.join(git_dir, 'packed-refs'), 'r') as f:
+            for line in f:
+                commit_hash, _, packed_ref = line.strip().partition(' ')
+                if packed_ref == ref:
+                    return commit_hash
+    except OSError:
+        pass
+
     return subprocess.check_output(["git", "rev-parse", "HEAD"]).strip().decode()
 
 
-def get_schema_intents(split: Literal['train', 'test', 'dev']) -> Dict[str, Set[str]]:
+@lru_cache(maxsize=None)
+def get_schema_intents(split: Literal['train', 'test', 'dev']) -> Dict[str, FrozenSet[str]]:
     """Returns a mapping of intent type (transactional/search) to a set of intents for
     the required split.
 
@@ -59,7 +90,8 @@ def get_schema_intents(split: Literal['train', 'test', 'dev']) -> Dict[str, Set[
     Returns
     -------
     intents
-        A mapping from intent type to a set of intent names of that type found in `split`.
+        A mapping from intent type to a set of intent names of that type found in `split`. The
+        output is cached so it should not be modified.
     """
 
     intents = {'transactional': set(), 'search': set()}
@@ -70,7 +102,7 @@ def get_schema_intents(split: Literal['train', 'test', 'dev']) -> Dict[str, Set[
             else:
                 intents['search'].add(intent['name'])
 
-    return intents
+    return {intent_type: frozenset(names) for intent_type, names in intents.items()}
 
 
 def get_intents_by_split() -> Dict[str, List[str]]:
@@ -79,11 +111,15 @@ def get_intents_by_split() -> Dict[str, List[str]]:
 
     intents_by_split = {}
     for split in _SPLIT_NAMES:
-        intents_by_split[split] = set().union(*get_schema_intents(split).values())
+        split_intents = set()
+        for intents in get_schema_intents(split).values():
+            split_intents.update(intents)
+        intents_by_split[split] = split_intents
 
-    return cast_vals_to_sorted_list(intents_by_split, sort_by=alphabetical_sort_key)
+    return cast_vals_to_sorted_list(intents_by_split)
 
 
+@lru_cache(maxsize=None)
 def get_intents_by_type() -> Dict[str, List[str]]:
     """Returns a mapping containing two keys:
     
@@ -96,6 +132,7 @@ def get_intents_by_type() -> Dict[str, List[str]]:
     -------
     all_intents
         A dictionary containing sorted lists of transactional and search intents as value sets.
+        The output is cached so it should not be modified.
     """  # noqa
     transactional_intents = set()
     search_intents = set()
@@ -108,8 +145,8 @@ def get_intents_by_type() -> Dict[str, List[str]]:
         )
 
     all_intents = {
-        'transactional': sorted(list(transactional_intents), key=alphabetical_sort_key),
-        'search': sorted(list(search_intents), key=alphabetical_sort_key)
+        'transactional': sorted(transactional_intents),
+        'search': sorted(search_intents)
     }
 
     return all_intents
@@ -137,6 +174,15 @@ def _get_requestables(dialogue: dict) -> Set[str]:
     return requestables
 
 
+def _get_file_requestables(filename: str) -> Set[str]:
+    """Get requestable slots in all the dialogues in `filename`."""
+
+    requestables = set()
+    for _, dialogue in file_iterator(filename):
+        requestables.update(_get_requestables(dialogue))
+    return requestables
+
+
 def get_requestable_slots() -> List[str]:
     """Return a list of all the slots requested by the user across the entire corpus.
     These slots are specified under the ``['state']['requestables']``
@@ -147,10 +193,11 @@ def get_requestable_slots() -> List[str]:
         A sorted list containing the slot names of the requestable slots across the entire corpus.
     """
     all_requestables = set()
-    for _, dialogue in corpus_iterator():
-        all_requestables.update(_get_requestables(dialogue))
+    for split in _SPLIT_NAMES:
+        for fp in get_filenames(split):
+            all_requestables.update(_get_file_requestables(fp))
 
-    return sorted(list(all_requestables), key=alphabetical_sort_key)
+    return sorted(all_requestables)
 
 
 def _find_service_binary_slots(service: dict) -> dict:
@@ -169,22 +216,19 @@ def _find_service_binary_slots(service: dict) -> dict:
     # TODO: LOOK INTO 0/1 VAL CASES AND SEE IF THESE ARE ACTUALLY DELEX (transfers slot is, for example)
     """
 
-    binary_slots = collections.defaultdict(set)
-    service_name = service['service_name']
+    # services that do not have binary slots are mapped to an empty set to ensure consistency
+    # between CATEGORICAL_SLOTS_BY_SERVICE and BINARY_SLOTS_BY SERVICE
+    service_binary_slots = set()
     for slot in service['slots']:
-        if slot['is_categorical']:
-            if len(values := slot['possible_values']) == 2:
-                condition_1 = 'True' in values
-                condition_2 = values[0].isdigit() and int(values[0]) <= 1
-                if condition_1 or condition_2:
-                    binary_slots[service_name].add(slot['name'])
-
-    # add an empty set for the services that do not have binary slots
-    # to ensure consistency between CATEGORICAL_SLOTS_BY_SERVICE and BINARY_SLOTS_BY SERVICE
-    if not binary_slots:
-        binary_slots[service_name] = set()
+        if not slot['is_categorical']:
+            continue
+        values = slot['possible_values']
+        if len(values) != 2:
+            continue
+        if values[0] == 'True' or values[1] == 'True' or values[0] in ('0', '1'):
+            service_binary_slots.add(slot['name'])
 
-    return binary_slots
+    return {service['service_name']: service_binary_slots}
 
 
 def get_binary_slots() -> Tuple[List[str], Dict[str, List[str]]]:
@@ -205,8 +249,10 @@ def get_binary_slots() -> Tuple[List[str], Dict[str, List[str]]]:
             service_binary_slots.update(binary_slots)
 
     # cast and sort output for writing to .json
-    binary_slots = list(set.union(*list(service_binary_slots.values())))
-    binary_slots.sort(key=alphabetical_sort_key)
+    all_binary_slots = set()
+    for slots in service_binary_slots.values():
+        all_binary_slots.update(slots)
+    binary_slots = sorted(all_binary_slots)
 
     return binary_slots, cast_vals_to_sorted_list(service_binary_slots)
 
@@ -275,6 +321,45 @@ def get_categorical_slots(binary_slots_by_service: Dict[str, List[str]]) -> \
     return list(all_cat_slots), cat_slots_by_service
 
 
+def _has_intent_types(intents: Set[str],
+                      transactional: bool,
+                      search: bool,
+                      transactional_intents: FrozenSet[str],
+                      search_intents: FrozenSet[str]) -> bool:
+    """Returns `True` if a dialogue with intents `intents` contains the types of intents indicated
+    by the kwargs. See `filter_by_intent_type` for details.
+    """
+
+    if transactional and not search:
+        return intents.issubset(transactional_intents)
+    elif search and not transactional:
+        return intents.issubset(search_intents)
+    else:
+        transctional_subset = intents.issubset(transactional_intents)
+        search_subset = intents.issubset(search_intents)
+
+        return not transctional_subset and not search_subset
+
+
+def _filter_file_by_intent_type(filename: str,
+                                transactional: bool,
+                                search: bool,
+                                transactional_intents: FrozenSet[str],
+                                search_intents: FrozenSet[str]) -> Set[str]:
+    """Returns the IDs of the dialogues in `filename` which contain the types of intents indicated
+    by the kwargs. See `filter_by_intent_type` for details.
+    """
+
+    dialogue_ids = set()
+    # the parsed file is cached since `_get_entity_slots` filters each file twice and then reads it again
+    for _, dial in file_iterator(filename, cache=True):
+        intents = get_dialogue_intents(dial)
+        if _has_intent_types(intents, transactional, search, transactional_intents, search_intents):
+            dialogue_ids.add(dial['dialogue_id'])
+
+    return dialogue_ids
+
+
 def filter_by_intent_type(split: Literal['train', 'test', 'dev'],
                           transactional: bool = True,
                           search: bool = False) -> Dict[str, set]:
@@ -304,29 +389,86 @@ def filter_by_intent_type(split: Literal['train', 'test', 'dev'],
         raise ValueError("At least one intent type must be specified")
 
     all_intents = get_intents_by_type()
-    transactional_intents = all_intents['transactional']
-    search_intents = all_intents['search']
+    transactional_intents = frozenset(all_intents['transactional'])
+    search_intents = frozenset(all_intents['search'])
 
     dialogue_ids = defaultdict(set)
-    for fp, dial in split_iterator(split):
-        dialogue_id = dial['dialogue_id']
-        intents = get_dialogue_intents(dial)
-        if transactional and not search:
-            if intents.issubset(transactional_intents):
-                dialogue_ids[fp].add(dialogue_id)
-        elif search and not transactional:
-            if intents.issubset(search_intents):
-                dialogue_ids[fp].add(dialogue_id)
-        else:
-            transctional_subset = intents.issubset(transactional_intents)
-            search_subset = intents.issubset(search_intents)
-
-            if not transctional_subset and not search_subset:
-                dialogue_ids[fp].add(dialogue_id)
+    for fp in get_filenames(split):
+        file_dialogue_ids = _filter_file_by_intent_type(
+            fp, transactional, search, transactional_intents, search_intents
+        )
+        if file_dialogue_ids:
+            dialogue_ids[fp] = file_dialogue_ids
 
     return dialogue_ids
 
 
+def _update_entity_slots(entity_slots_map: Dict[str, Dict[str, Set[str]]],
+                         dialogue: dict,
+                         search_intents: FrozenSet[str]):
+    """Intersects the entity slots in `entity_slots_map` with the slots the system mentions in
+    `dialogue` following successful calls to search intents. See `_get_entity_slots` for details.
+    """
+
+    for turn in dialogue_iterator(dialogue, user=False, system=True):
+        if 'service_call' in (frame := turn['frames'][0]):
+            service = frame['service']
+            intent = frame['service_call']['method']
+            service_results = frame['service_results']
+            if intent in search_intents and service_results:
+                mentioned_slots = {entry['slot'] for entry in frame['slots']}
+                _intersect_entity_slots(entity_slots_map, service, intent, mentioned_slots)
+
+
+def _intersect_entity_slots(entity_slots_map: Dict[str, Dict[str, Set[str]]],
+                            service: str,
+                            intent: str,
+                            mentioned_slots: Set[str]):
+    """Intersects the entity slots of `intent` of `service` with `mentioned_slots`. The latter
+    become the entity slots if `intent` has not been encountered before.
+    """
+
+    service_slots = entity_slots_map.setdefault(service, {})
+    if intent in service_slots:
+        service_slots[intent] = service_slots[intent].intersection(mentioned_slots)
+    else:
+        service_slots[intent] = mentioned_slots
+
+
+def _merge_entity_slots(entity_slots_map: Dict[str, Dict[str, Set[str]]],
+                        other: Dict[str, Dict[str, Set[str]]]):
+    """Intersects the entity slots in `entity_slots_map` with the entity slots in `other`, a
+    mapping with the same structure computed for a different set of dialogues.
+    """
+
+    for service, intents in other.items():
+        for intent, mentioned_slots in intents.items():
+            _intersect_entity_slots(entity_slots_map, service, intent, mentioned_slots)
+
+
+def _get_file_entity_slots(filename: str,
+                           dial_ids: Set[str],
+                           search_intents: FrozenSet[str]) -> Dict[str, Dict[str, Set[str]]]:
+    """Find the entity slots in a subset of the dialogues in a file. See `_get_entity_slots`
+    for details.
+
+    Parameters
+    ----------
+    filename
+        The file containing the dialogues.
+    dial_ids
+        The IDs of the dialogues to be processed.
+    search_intents
+        Set of search/query intents.
+    """
+
+    entity_slots_map = {}
+    for fp, dial in file_iterator(filename, return_only=dial_ids, cache=True):
+        _update_entity_slots(entity_slots_map, dial, search_intents)
+
+    return entity_slots_map
+
+
 def _get_entity_slots(split: Literal['train', 'test', 'dev']) -> Dict[str, Dict[str, Set[str]]]:
     """Find the slots that are always specified by the system when a call to a "search" intent
     is made (referred to as "entity" slots).
@@ -359,25 +501,34 @@ def _get_entity_slots(split: Literal['train', 'test', 'dev']) -> Dict[str, Dict[
 
     # iterate through selected dialogues to find slots that are always specified after a
     # call to a given intent ("entity slot").
-    entity_slots_map = defaultdict(lambda: collections.defaultdict(set))
-    search_intents = set(get_intents_by_type()['search'])
-    for file in filtered_dialogues.keys():
-        for fp, dial in file_iterator(file, return_only=filtered_dialogues[file]):
-            for turn in dialogue_iterator(dial, user=False, system=True):
-                if 'service_call' in (frame := turn['frames'][0]):
-                    service = frame['service']
-                    intent = frame['service_call']['method']
-                    service_results = frame['service_results']
-                    if intent in search_intents and service_results:
-                        mentioned_slots = {entry['slot'] for entry in frame['slots']}
-                        if intent in entity_slots_map[service]:
-                            entity_slots_map[service][intent] = \
-                                entity_slots_map[service][intent].intersection(mentioned_slots)
-                        else:
-                            entity_slots_map[service][intent] = mentioned_slots
+    entity_slots_map = {}
+    search_intents = frozenset(get_intents_by_type()['search'])
+    for fp, dial_ids in filtered_dialogues.items():
+        _merge_entity_slots(entity_slots_map, _get_file_entity_slots(fp, dial_ids, search_intents))
     return entity_slots_map
 
 
+def _merge_split_entity_slots(split_entity_slots: List[Dict[str, Dict[str, Set[str]]]]) -> \
+        Dict[str, Dict[str, List[str]]]:
+    """Takes the union of the entity slots found in each split (see `_get_entity_slots`) and
+    converts them to sorted lists.
+    """
+
+    entity_slots = {}
+    for this_split_slots in split_entity_slots:
+        for service, intents in this_split_slots.items():
+            service_slots = entity_slots.setdefault(service, {})
+            for intent, slots in intents.items():
+                service_slots.setdefault(intent, set()).update(slots)
+
+    # cast and covert to list for writing to .json
+    for service in entity_slots:
+        for intent in entity_slots[service]:
+            entity_slots[service][intent] = sorted(entity_slots[service][intent])
+
+    return entity_slots
+
+
 def get_entity_slots_map() -> Dict[str, Dict[str, Set[str]]]:
     """Returns a nested map from service name to intent name to the slots that are always
     specified by the system following a _successful_ call to a search/query intent.
@@ -396,32 +547,10 @@ def get_entity_slots_map() -> Dict[str, Dict[str, Set[str]]]:
         which contains the entity slots for all the services and intents in the corpus.
     """
 
-    # TODO: IMPROVE THIS IN SPARE TIME, SHOULD BE LESS VERBOSE
-    entity_slots = {}
-    for split in _SPLIT_NAMES:
-        this_split_slots = _get_entity_slots(split)
-        if not entity_slots:
-            entity_slots = this_split_slots
-        else:
-            for service in this_split_slots:
-                if service not in entity_slots:
-                    entity_slots[service] = this_split_slots[service]
-                else:
-                    for intent in this_split_slots[service]:
-                        if intent not in this_split_slots[service]:
-                            entity_slots[service][intent] = this_split_slots[service][intent]
-                        else:
-                            entity_slots[service][intent].update(this_split_slots[service][intent])
-
-    # cast and covert to list for writing to .json
-    for service in entity_slots:
-        for intent in entity_slots[service]:
-            entity_slots[service][intent] = list(entity_slots[service][intent])
-            entity_slots[service][intent].sort(key=alphabetical_sort_key)
-
-    return entity_slots
+    return _merge_split_entity_slots([_get_entity_slots(split) for split in _SPLIT_NAMES])
 
 
+@lru_cache(maxsize=None)
 def _map_intents_to_services() -> Dict[str, Dict[str, List[str]]]:
     """Create a map of intents to services. The same intent (e.g., `FindRestaurant`) can
     be part of multiple service APIs (e.g., `Restaurant_1` and `Restaurant_2`.
@@ -436,18 +565,56 @@ def _map_intents_to_services() -> Dict[str, Dict[str, List[str]]]:
                 'intent_1': ['Service_1']
                 `intent_2': ['Service_1', 'Service_2']
             }
+
+        The output is cached so it should not be modified.
     """
-    intents_to_services = defaultdict(lambda: defaultdict(list))
+    intents_to_services = {split: {} for split in _SPLIT_NAMES}
     for split in _SPLIT_NAMES:
+        split_intents_to_services = intents_to_services[split]
         for service in schema_iterator(split):
             for intent in service["intents"]:
-                intent_name = intent['name']
-                intents_to_services[split][intent_name].append(
-                    service['service_name'])
+                split_intents_to_services.setdefault(intent['name'], []).append(service['service_name'])
 
     return intents_to_services
 
 
+def _get_dialogue_type(dialogue: dict, transactional_intents: FrozenSet[str]) -> str:
+    """Returns the type of `dialogue` (``'transactional'``, ``'search'`` or ``'mixed_intent'``)
+    given the intents the user activates. See `get_dialogues_by_type` for details.
+    """
+
+    transactional, search = False, False
+    for turn in dialogue_iterator(dialogue, user=True, system=False):
+        for frame in turn['frames']:
+            active_intent = frame['state']['active_intent']
+            if active_intent == 'NONE':
+                continue
+            if active_intent in transactional_intents:
+                transactional = True
+            else:
+                search = True
+            # the remaining frames cannot change the type once both intent types are found
+            if transactional and search:
+                return 'mixed_intent'
+    if transactional:
+        return 'transactional'
+    elif search:
+        return 'search'
+    return 'mixed_intent'
+
+
+def _get_file_dialogues_by_type(filename: str, transactional_intents: FrozenSet[str]) -> Dict[str, List[str]]:
+    """Returns a mapping from dialogue type to the IDs of the dialogues of that type in `filename`.
+    See `get_dialogues_by_type` for details.
+    """
+
+    dialogues_by_type = {dialogue_type: [] for dialogue_type in _DIALOGUE_TYPES}
+    for _, dial in file_iterator(filename):
+        dialogues_by_type[_get_dialogue_type(dial, transactional_intents)].append(dial['dialogue_id'])
+
+    return dialogues_by_type
+
+
 def get_dialogues_by_type(intents_mapping: dict) -> Dict[str, Dict[str, List[str]]]:
     """Returns a mapping from dialogue type (transactional intent only, search intent only,
     mixed intent) to dialogue IDs.
@@ -464,36 +631,22 @@ def get_dialogues_by_type(intents_mapping: dict) -> Dict[str, Dict[str, List[str
             }
     """
 
-    dialogues_by_type = collections.defaultdict(lambda: collections.defaultdict(list))
+    dialogues_by_type = {split: {dialogue_type: [] for dialogue_type in _DIALOGUE_TYPES} for split in _SPLIT_NAMES}
+    transactional_intents = frozenset(intents_mapping['transactional'])
 
     for split in _SPLIT_NAMES:
-        for _, dial in split_iterator(split):
-            dialogue_id = dial['dialogue_id']
-            transactional, search = False, False
-            for turn in dialogue_iterator(dial, user=True, system=False):
-                for frame in turn['frames']:
-                    active_intent = frame['state']['active_intent']
-                    if active_intent != 'NONE':
-                        if active_intent in intents_mapping['transactional']:
-                            transactional = True
-                        else:
-                            search = True
-                if transactional and search:
-                    break
-            if transactional and not search:
-                dialogues_by_type[split]['transactional'].append(dialogue_id)
-            elif search and not transactional:
-                dialogues_by_type[split]['search'].append(dialogue_id)
-            else:
-                dialogues_by_type[split]['mixed_intent'].append(dialogue_id)
+        for fp in get_filenames(split):
+            for dialogue_type, dialogue_ids in _get_file_dialogues_by_type(fp, transactional_intents).items():
+                dialogues_by_type[split][dialogue_type].extend(dialogue_ids)
 
-        for intent_type in dialogues_by_type:
-            dialogues_by_type[split][intent_type].sort(key=dial_sort_key)
+        for intent_type in dialogues_by_type[split]:
+            dialogues_by_type[split][intent_type] = sort_dialogue_ids(dialogues_by_type[split][intent_type])
 
     return dialogues_by_type
 
 
-def get_services(split: Literal['train', 'test', 'dev']) -> Set[str]:
+@lru_cache(maxsize=None)
+def get_services(split: Literal['train', 'test', 'dev']) -> FrozenSet[str]:
     """Returns a set of services invoked in a dataset split.
 
     Parameters
@@ -505,7 +658,7 @@ def get_services(split: Literal['train', 'test', 'dev']) -> Set[str]:
     -------
         Set of services invoked in `split`.
     """
-    return {service['service_name'] for service in schema_iterator(split)}
+    return frozenset(service['service_name'] for service in schema_iterator(split))
 
 
 def get_file_services(filename: str) -> Set[str]:
@@ -513,7 +666,10 @@ def get_file_services(filename: str) -> Set[str]:
     be prefixed by the split name (e.g., `train/dialogues_001.json`).
     """
 
-    return set().union(*(dial['services'] for _, dial in file_iterator(filename)))
+    services = set()
+    for dialogue_services in field_iterator(filename, 'services'):
+        services.update(dialogue_services)
+    return services
 
 
 def get_service_to_file_map() -> Dict[str, Dict[str, List[str]]]:
@@ -527,21 +683,35 @@ def get_service_to_file_map() -> Dict[str, Dict[str, List[str]]]:
             }
     """
 
-    split_to_files = {split: get_filenames(split) for split in _SPLIT_NAMES}
-    splits_to_services_files = collections.defaultdict(lambda: collections.defaultdict(set))
+    splits_to_services_files = {}
     for split in _SPLIT_NAMES:
-        services = get_services(split)
-        for service in services:
-            splits_to_services_files[split][service] = set(split_to_files[split])
-        for file in split_to_files[split]:
-            this_file_services = get_file_services(file)
-            missing_services = services - set(this_file_services)
-            for entry in missing_services:
-                splits_to_services_files[split][entry].remove(file)
+        filenames = get_filenames(split)
+        files_services = []
+        for fp in filenames:
+            files_services.append(get_file_services(fp))
+        splits_to_services_files[split] = _map_services_to_files(get_services(split), filenames, files_services)
 
     return cast_vals_to_sorted_list(splits_to_services_files, sort_by=dial_files_sort_key)
 
 
+def _map_services_to_files(services: FrozenSet[str],
+                           filenames: List[str],
+                           files_services: List[Set[str]]) -> Dict[str, Set[str]]:
+    """Maps each service in `services` to the files in `filenames` where it appears. `files_services`
+    contains the services of each file, in the same order as `filenames`.
+    """
+
+    # services which are not in the schema are ignored and those which do not appear in any file are
+    # mapped to an empty set
+    services_to_files = {service: set() for service in services}
+    for file, this_file_services in zip(filenames, files_services):
+        for service in this_file_services:
+            if service in services_to_files:
+                services_to_files[service].add(file)
+
+    return services_to_files
+
+
 def get_multiple_services_dialogues() -> Dict[str, List[str]]:
     """Find all the dialogues in the corpus which contain multiple services. Can
     be used in combination with `utils.split_iterator()` to iterate only through
@@ -556,19 +726,220 @@ def get_multiple_services_dialogues() -> Dict[str, List[str]]:
         }
     """
     multi_service = defaultdict(list)
-    for fp, dialogue in corpus_iterator():
-        *_, split = os.path.dirname(fp).split("/")
-        multi_service[split].append(dialogue['dialogue_id'])
+    for split in _SPLIT_NAMES:
+        for fp in get_filenames(split):
+            multi_service[split].extend(field_iterator(fp, 'dialogue_id'))
 
     return multi_service
 
 
+_FileScan = collections.namedtuple(
+    '_FileScan',
+    ['requestable_slots', 'dialogues_by_type', 'entity_slots', 'dialogue_ids', 'services'],
+)
+
+CorpusScan = collections.namedtuple(
+    'CorpusScan',
+    ['requestable_slots', 'dialogues_by_type', 'entity_slots', 'multiple_services_dialogues', 'services_to_files'],
+)
+CorpusScan.__doc__ = """Metadata extracted from the dialogues in a single pass through the corpus. The fields
+have the same format as the outputs of `get_requestable_slots`, `get_dialogues_by_type`, `get_entity_slots_map`,
+`get_multiple_services_dialogues` and `get_service_to_file_map`, respectively.
+"""
+
+
+def _dialogue_intent_flags_loop(dialogue_idx: np.ndarray,
+                                intent_ids: np.ndarray,
+                                is_none: np.ndarray,
+                                is_transactional: np.ndarray,
+                                is_search: np.ndarray,
+                                n_dialogues: int) -> np.ndarray:
+    """Computes the intent types in each dialogue given the active intents in the user frames.
+
+    Parameters
+    ----------
+    dialogue_idx, intent_ids
+        The dialogue index and active intent ID of each user frame (see `data_utils.FileColumns`).
+    is_none, is_transactional, is_search
+        Boolean arrays indexed by intent ID, indicating whether the intent is ``'NONE'``, transactional
+        or a search intent, respectively.
+    n_dialogues
+        Number of dialogues.
+
+    Returns
+    -------
+    flags
+        A boolean array of shape ``(n_dialogues, 3)``. The columns indicate whether each dialogue contains
+        a transactional intent, an intent which is not transactional and an intent which is not a
+        search intent, respectively. ``'NONE'`` intents are ignored.
+    """
+
+    flags = np.zeros((n_dialogues, 3), dtype=np.bool_)
+    for frame in range(dialogue_idx.shape[0]):
+        intent = intent_ids[frame]
+        if is_none[intent]:
+            continue
+        dial_idx = dialogue_idx[frame]
+        if is_transactional[intent]:
+            flags[dial_idx, 0] = True
+        else:
+            flags[dial_idx, 1] = True
+        if not is_search[intent]:
+            flags[dial_idx, 2] = True
+    return flags
+
+
+def _dialogue_intent_flags_numpy(dialogue_idx: np.ndarray,
+                                 intent_ids: np.ndarray,
+                                 is_none: np.ndarray,
+                                 is_transactional: np.ndarray,
+                                 is_search: np.ndarray,
+                                 n_dialogues: int) -> np.ndarray:
+    """Vectorised equivalent of `_dialogue_intent_flags_loop`, used if ``numba`` is not installed."""
+
+    active = ~is_none[intent_ids]
+    transactional = is_transactional[intent_ids]
+    flags = np.zeros((n_dialogues, 3), dtype=np.bool_)
+    flags[dialogue_idx[active & transactional], 0] = True
+    flags[dialogue_idx[active & ~transactional], 1] = True
+    flags[dialogue_idx[active & ~is_search[intent_ids]], 2] = True
+    return flags
+
+
+@lru_cache(maxsize=None)
+def _get_dialogue_intent_flags() -> Callable:
+    """Returns `_dialogue_intent_flags_loop` compiled with ``numba`` if it is installed and
+    `_dialogue_intent_flags_numpy` otherwise. ``numba`` is imported on first use, since importing
+    it is slow relative to the rest of the module.
+    """
+
+    try:
+        from numba import njit
+    except ImportError:
+        return _dialogue_intent_flags_numpy
+    return njit(cache=True)(_dialogue_intent_flags_loop)
+
+
+def _scan_file(filename: str, transactional_intents: FrozenSet[str], search_intents: FrozenSet[str]) -> _FileScan:
+    """Extracts all the metadata computed by `scan_corpus` from the dialogues in `filename`. The
+    columnar view of the file is used so the analyses are vectorised across the user frames and
+    service calls of all dialogues in the file.
+    """
+
+    columns = get_file_columns(filename)
+    dialogue_ids = columns.dialogue_ids
+    n_dialogues = len(dialogue_ids)
+
+    services = set()
+    for dialogue_services in columns.dialogue_services:
+        services.update(dialogue_services)
+    requestables = set()
+    for requested_slots in columns.user_requested_slots:
+        requestables.update(requested_slots)
+
+    # classify dialogues based on the intents active in the user frames, see `_get_dialogue_type`
+    vocabulary = columns.intent_vocabulary
+    flags = _get_dialogue_intent_flags()(
+        columns.user_dialogue_idx,
+        columns.user_intent_ids,
+        np.array([intent == 'NONE' for intent in vocabulary], dtype=np.bool_),
+        np.array([intent in transactional_intents for intent in vocabulary], dtype=np.bool_),
+        np.array([intent in search_intents for intent in vocabulary], dtype=np.bool_),
+        n_dialogues,
+    )
+    has_transactional, has_other, has_non_search = flags[:, 0], flags[:, 1], flags[:, 2]
+    dialogues_by_type = {dialogue_type: [] for dialogue_type in _DIALOGUE_TYPES}
+    for dialogue_id, transactional, search in zip(dialogue_ids, has_transactional, has_other):
+        if transactional and not search:
+            dialogues_by_type['transactional'].append(dialogue_id)
+        elif search and not transactional:
+            dialogues_by_type['search'].append(dialogue_id)
+        else:
+            dialogues_by_type['mixed_intent'].append(dialogue_id)
+
+    # entity slots are extracted from mixed intent and search only dialogues, see `_get_entity_slots`.
+    # These are the dialogues whose intents are a subset of the search intents or which contain at
+    # least an intent which is not transactional.
+    selected = ~has_non_search | has_other
+    call_methods = columns.call_methods
+    successful_calls = selected[columns.call_dialogue_idx] & columns.call_has_results & \
+        np.isin(call_methods, list(search_intents))
+    entity_slots_map = {}
+    for call in np.flatnonzero(successful_calls):
+        _intersect_entity_slots(
+            entity_slots_map,
+            str(columns.call_services[call]),
+            str(call_methods[call]),
+            columns.call_mentioned_slots[call],
+        )
+
+    return _FileScan(requestables, dialogues_by_type, entity_slots_map, dialogue_ids, services)
+
+
+def scan_corpus(intents_by_type: Dict[str, List[str]]) -> CorpusScan:
+    """Extracts the dialogue metadata in a single pass through the corpus, so that each dialogue
+    file is parsed only once.
+
+    Parameters
+    ----------
+    intents_by_type
+        Output of `get_intents_by_type`.
+
+    Returns
+    -------
+    The metadata extracted from the corpus, see `CorpusScan`.
+    """
+
+    worker = partial(
+        _scan_file,
+        transactional_intents=frozenset(intents_by_type['transactional']),
+        search_intents=frozenset(intents_by_type['search']),
+    )
+
+    requestables = set()
+    dialogues_by_type = {}
+    split_entity_slots = []
+    multi_service = {}
+    splits_to_services_files = {}
+    file_scans_by_split = parallel_corpus_map(worker, _SPLIT_NAMES)
+    for split in _SPLIT_NAMES:
+        filenames = get_filenames(split)
+        file_scans = file_scans_by_split[split]
+        split_dialogues_by_type = {dialogue_type: [] for dialogue_type in _DIALOGUE_TYPES}
+        entity_slots_map = {}
+        multi_service[split] = []
+        for file_scan in file_scans:
+            requestables.update(file_scan.requestable_slots)
+            for dialogue_type, dialogue_ids in file_scan.dialogues_by_type.items():
+                split_dialogues_by_type[dialogue_type].extend(dialogue_ids)
+            _merge_entity_slots(entity_slots_map, file_scan.entity_slots)
+            multi_service[split].extend(file_scan.dialogue_ids)
+        dialogues_by_type[split] = {
+            dialogue_type: sort_dialogue_ids(dialogue_ids)
+            for dialogue_type, dialogue_ids in split_dialogues_by_type.items()
+        }
+        split_entity_slots.append(entity_slots_map)
+        splits_to_services_files[split] = _map_services_to_files(
+            get_services(split), filenames, [file_scan.services for file_scan in file_scans]
+        )
+
+    return CorpusScan(
+        requestable_slots=sorted(requestables),
+        dialogues_by_type=dialogues_by_type,
+        entity_slots=_merge_split_entity_slots(split_entity_slots),
+        multiple_services_dialogues=multi_service,
+        services_to_files=cast_vals_to_sorted_list(splits_to_services_files, sort_by=dial_files_sort_key),
+    )
+
+
 if __name__ == '__main__':
 
     # find transactional and search/query intents in the corpus
     _intents_by_type = get_intents_by_type()
+    # extract the metadata which requires iterating through the dialogues
+    corpus_scan = scan_corpus(_intents_by_type)
     # map the dialogues of each split to their type (transactional/search/mixed_intent)
-    _dialogues_by_type = get_dialogues_by_type(_intents_by_type)
+    _dialogues_by_type = corpus_scan.dialogues_by_type
     transactional_dialogues = {
         split: _dialogues_by_type[split]['transactional'] for split in _dialogues_by_type}
     search_dialogues = {
@@ -582,18 +953,17 @@ if __name__ == '__main__':
     # find categorical slots for each intent in each service
     categorical_slots, categorical_slots_by_service = get_categorical_slots(binary_slots_by_service)
     # find entity slots and perform conversions to list
-    entity_slots = get_entity_slots_map()
+    entity_slots = corpus_scan.entity_slots
 
     metadata = {
         'VERSION': get_commit_hash(),
-        'SERVICES_TO_FILES': get_service_to_file_map(),
-        'ALL_INTENTS': sorted(
-            _intents_by_type['search'] + _intents_by_type['transactional'], key=alphabetical_sort_key),
+        'SERVICES_TO_FILES': corpus_scan.services_to_files,
+        'ALL_INTENTS': sorted(_intents_by_type['search'] + _intents_by_type['transactional']),
         'SEARCH_INTENTS': _intents_by_type['search'],
         'TRANSACTIONAL_INTENTS': _intents_by_type['transactional'],
         'INTENTS_TO_SERVICES': _map_intents_to_services(),
         'INTENTS_BY_SPLIT': get_intents_by_split(),
-        'REQUESTABLE_SLOTS': get_requestable_slots(),
+        'REQUESTABLE_SLOTS': corpus_scan.requestable_slots,
         'BINARY_SLOTS': binary_slots,
         'BINARY_SLOTS_BY_SERVICE': binary_slots_by_service,
         'CATEGORICAL_SLOTS': categorical_slots,
@@ -603,7 +973,7 @@ if __name__ == '__main__':
         'TRANSACTIONAL_DIALOGUES': transactional_dialogues,
         'SEARCH_DIALOGUES': search_dialogues,
         'MIXED_INTENT_DIALOGUES': mixed_intent_dialogues,
-        'MULTIPLE_SERVICES_DIALOGUES': get_multiple_services_dialogues(),
+        'MULTIPLE_SERVICES_DIALOGUES': corpus_scan.multiple_services_dialogues,
     }
 
     with open('metadata.json', 'w') as f:
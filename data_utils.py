@@ -2,35 +2,176 @@
 be used for sorting.
 """
 
-from collections import defaultdict
-from typing import Tuple, List, Dict, Optional, Set
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple, List, Dict, Optional, Set
 from typing_extensions import Literal
 
-import glob
+import functools
 import itertools
-import json
+import math
+import mmap
 import os
 
 import numpy as np
 
+# prefer a faster parser when one is installed; all of them return native dicts and lists
+try:
+    import orjson as _json
+except ImportError:
+    try:
+        # pysimdjson; its loads returns native objects, unlike the lazy proxies of simdjson.Parser
+        import simdjson as _json
+    except ImportError:
+        try:
+            import ujson as _json
+        except ImportError:
+            import json as _json
+
+# stream-parsing is only faster than a full parse with the C backend of ijson
+try:
+    import ijson
+except ImportError:
+    ijson = None
+if ijson is not None and ijson.backend != 'yajl2_c':
+    ijson = None
+
 _SPLIT_NAMES = ['train', 'test', 'dev']
 directory = os.path.dirname(__file__)
 _SCHEMA_PATHS = {split: f"{directory}/{split}/schema.json" for split in _SPLIT_NAMES}
+_SCHEMA_CACHE = {}  # type: Dict[str, List[dict]]
+# files larger than this (in bytes) are memory-mapped instead of read when parsed with orjson
+_MMAP_THRESHOLD = 1 << 20
+# number of files read ahead of the consumer by split_iterator
+_PREFETCH_WINDOW = 4
 
 
-def reconstruct_filename(dial_id: str) -> str:
-    """Reconstruct filename from dialogue ID."""
+def _read_json(path: str):
+    """Parses the .json file at `path`. Large files are memory-mapped if the parser can read
+    from a buffer (i.e., orjson), so that their contents are not copied into a `bytes` object.
+    """
+    with open(path, 'rb') as f:
+        if _json.__name__ == 'orjson' and os.fstat(f.fileno()).st_size > _MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as buffer:
+                return _json.loads(buffer)
+        return _json.loads(f.read())
 
-    file_prefix = int(dial_id.split("_")[0])
 
-    if file_prefix in range(10):
-        str_file_prefix = f'00{file_prefix}'
-    elif file_prefix in range(10, 100):
-        str_file_prefix = f'0{file_prefix}'
-    else:
-        str_file_prefix = f'{file_prefix}'
+@functools.lru_cache(maxsize=None)
+def _load_dial_bunch(filename: str) -> List[dict]:
+    """Parses a dialogues file. The result is memoized so that each file in the corpus is parsed
+    at most once per process; callers must not mutate the returned dialogues.
+
+    The cache is unbounded, so it is only used when requested with ``file_iterator(..., cache=True)``
+    by functions which visit the same files repeatedly. Use `clear_caches` to release the parsed files.
+    """
+    return _read_json(filename)
+
+
+FileColumns = namedtuple(
+    'FileColumns',
+    [
+        'dialogue_ids',
+        'dialogue_services',
+        'intent_vocabulary',
+        'user_dialogue_idx',
+        'user_intent_ids',
+        'user_requested_slots',
+        'call_dialogue_idx',
+        'call_services',
+        'call_methods',
+        'call_has_results',
+        'call_mentioned_slots',
+    ],
+)
+FileColumns.__doc__ = """Columnar view of the annotations of the dialogues in a file, which allows analyses to scan the
+fields they need without walking the nested dialogue dictionaries. The fields are:
+
+    - ``dialogue_ids``, ``dialogue_services``: lists with the ID and services of each dialogue, in file order
+
+    - ``intent_vocabulary``: list of the distinct active intents in the file (including ``'NONE'``)
+
+    - ``user_*``: one entry for each frame of each user turn. ``user_dialogue_idx`` is an integer array with \
+    the position of the frame's dialogue in ``dialogue_ids``, ``user_intent_ids`` is an integer array with the \
+    position of the frame's ``['state']['active_intent']`` in ``intent_vocabulary`` and ``user_requested_slots`` \
+    is a list with the ``['state']['requested_slots']`` of each frame
+
+    - ``call_*``: one entry for each system turn whose (first) frame contains a service call. ``call_dialogue_idx`` \
+    is as above, ``call_services`` and ``call_methods`` are string arrays with the frame service and called \
+    method, ``call_has_results`` is a boolean array which is `True` if the call returned results and \
+    ``call_mentioned_slots`` is a list with the set of slots in the frame ``['slots']``
+"""
+
+
+def get_file_columns(filename: str) -> FileColumns:
+    """Returns the columnar view of the dialogues in `filename` (see `FileColumns`). The file is parsed
+    without caching, so only the columns are kept in memory by the caller.
+    """
+    return _project_columns(_read_json(filename))
+
+
+def _project_columns(dial_bunch: List[dict]) -> FileColumns:
+    """Builds the columnar view of the parsed dialogues in `dial_bunch` (see `FileColumns`)."""
+
+    dialogue_ids, dialogue_services = [], []
+    intent_ids = {}  # type: Dict[str, int]
+    user_dialogue_idx, user_intent_ids, user_requested_slots = [], [], []
+    call_dialogue_idx, call_services, call_methods, call_has_results, call_mentioned_slots = [], [], [], [], []
+    for dial_idx, dial in enumerate(dial_bunch):
+        dialogue_ids.append(dial['dialogue_id'])
+        dialogue_services.append(dial['services'])
+        for turn in dial['turns']:
+            speaker = turn['speaker']
+            if speaker != 'SYSTEM':
+                for frame in turn['frames']:
+                    state = frame['state']
+                    user_dialogue_idx.append(dial_idx)
+                    user_intent_ids.append(intent_ids.setdefault(state['active_intent'], len(intent_ids)))
+                    user_requested_slots.append(state['requested_slots'])
+            if speaker != 'USER' and 'service_call' in (frame := turn['frames'][0]):
+                call_dialogue_idx.append(dial_idx)
+                call_services.append(frame['service'])
+                call_methods.append(frame['service_call']['method'])
+                call_has_results.append(bool(frame['service_results']))
+                call_mentioned_slots.append({entry['slot'] for entry in frame['slots']})
+
+    return FileColumns(
+        dialogue_ids=dialogue_ids,
+        dialogue_services=dialogue_services,
+        intent_vocabulary=list(intent_ids),
+        user_dialogue_idx=np.array(user_dialogue_idx, dtype=np.int64),
+        user_intent_ids=np.array(user_intent_ids, dtype=np.int32),
+        user_requested_slots=user_requested_slots,
+        call_dialogue_idx=np.array(call_dialogue_idx, dtype=np.int64),
+        call_services=np.array(call_services, dtype=str),
+        call_methods=np.array(call_methods, dtype=str),
+        call_has_results=np.array(call_has_results, dtype=bool),
+        call_mentioned_slots=call_mentioned_slots,
+    )
+
+
+def _load_schema(split: Literal['train', 'test', 'dev']) -> List[dict]:
+    """Parses the schema of `split`, memoizing the result in `_SCHEMA_CACHE`."""
+    if split not in _SCHEMA_CACHE:
+        _SCHEMA_CACHE[split] = _read_json(_SCHEMA_PATHS[split])
+    return _SCHEMA_CACHE[split]
+
+
+def clear_caches():
+    """Releases the parsed dialogue files and the schemas held in memory."""
+    _load_dial_bunch.cache_clear()
+    _get_dialogue_positions.cache_clear()
+    _SCHEMA_CACHE.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _prefix_to_filename(prefix: str) -> str:
+    return f"dialogues_{prefix.zfill(3)}.json"
 
-    return f'dialogues_{str_file_prefix}.json'
+
+def reconstruct_filename(dial_id: str) -> str:
+    """Reconstruct filename from dialogue ID."""
+    return _prefix_to_filename(dial_id.partition('_')[0])
 
 
 def get_file_map(dialogue_ids: List, split: Literal['train', 'test', 'dev']) -> Dict[str, List]:
@@ -38,59 +179,133 @@ def get_file_map(dialogue_ids: List, split: Literal['train', 'test', 'dev']) ->
     comprising dialogues from `dialogue_ids` that are in the same file.
     """
 
-    file_map = defaultdict(list)
-
+    file_map = {}
+    split_dir = f"{directory}/{split}"
     for id in dialogue_ids:
-        file_map[f"{directory}/{split}/{reconstruct_filename(id)}"].append(id)
+        prefix = id.partition('_')[0]
+        file_map.setdefault(f"{split_dir}/{_prefix_to_filename(prefix)}", []).append(id)
 
     return file_map
 
 
 def get_filenames(split: Literal['train', 'test', 'dev']) -> List[str]:
-    """Returns a list of filenames in a given split.
+    """Returns a list of filenames in a given split, sorted by name.
+    """
+    with os.scandir(f"{directory}/{split}") as entries:
+        return sorted(
+            entry.path for entry in entries if entry.name.startswith('dialogues') and entry.name.endswith('.json')
+        )
+
+
+def _stream_dialogues(filename: str, return_only: Set[str]) -> Iterator[Tuple[str, dict]]:
+    """Stream-parses `filename` and yields the dialogues in `return_only`, in file order. Parsing stops
+    as soon as all the dialogues in `return_only` have been returned.
+    """
+
+    returned = set()
+    with open(filename, 'rb') as f:
+        for dial in ijson.items(f, 'item', use_float=True):
+            if (found_id := dial['dialogue_id']) in return_only:
+                returned.add(found_id)
+                yield filename, dial
+                if returned == return_only:
+                    break
+
+
+def _dialogue_positions(dial_bunch: List[dict]) -> Dict[str, int]:
+    """Maps the IDs of the dialogues in `dial_bunch` to their position in the list. Used to index files
+    where the dialogue indices are not contiguous.
     """
-    return glob.glob(f"{directory}/{split}/dialogues*.json")
+    return {dial['dialogue_id']: dial_idx for dial_idx, dial in enumerate(dial_bunch)}
+
+
+@functools.lru_cache(maxsize=None)
+def _get_dialogue_positions(filename: str) -> Dict[str, int]:
+    """Memoized `_dialogue_positions` of the dialogues in `filename`, for files held in the cache."""
+    return _dialogue_positions(_load_dial_bunch(filename))
+
 
+def file_iterator(filename: str,
+                  return_only: Optional[Set[str]] = None,
+                  stream: bool = False,
+                  cache: bool = False) -> Tuple[str, dict]:
+    """Yields the dialogues in `filename`, or only those with IDs in `return_only` if specified.
+
+    If `stream` is `True`, ``ijson`` is installed and `return_only` is specified, the file is stream-parsed
+    instead of being loaded in memory in full. This is useful when only a few of the dialogues in the
+    file are needed.
+
+    If `cache` is `True`, the parsed file is memoized so that later calls with ``cache=True`` do not parse
+    it again (see `clear_caches`). The yielded dialogues are then shared between calls and must not be
+    modified. Otherwise, each call yields freshly parsed dialogues.
+    """
 
-def file_iterator(filename: str, return_only: Optional[Set[str]] = None) -> Tuple[str, dict]:
+    if return_only and stream and ijson is not None:
+        yield from _stream_dialogues(filename, return_only)
+        return
 
-    with open(filename, 'r') as f:
-        dial_bunch = json.load(f)
+    dial_bunch = _load_dial_bunch(filename) if cache else _read_json(filename)
 
-    max_index = int(dial_bunch[-1]['dialogue_id'].split("_")[1]) + 1
+    max_index = int(dial_bunch[-1]['dialogue_id'].partition("_")[2]) + 1
     n_dialogues = len(dial_bunch)
     missing_dialogues = not (max_index == n_dialogues)
 
     if return_only:
+        # the requested dialogues are returned in file order so that the parsed file is read sequentially
         if not missing_dialogues:
-            for dial_idx in (int(dial_id.split("_")[1]) for dial_id in return_only):
-                yield filename, dial_bunch[dial_idx]
+            positions = sorted(int(dial_id.partition("_")[2]) for dial_id in return_only)
         else:
-            returned = set()
-            for dial in dial_bunch:
-                if (found_id := dial['dialogue_id']) in return_only:
-                    returned.add(found_id)
-                    yield filename, dial
-                    if returned == return_only:
-                        break
+            dial_positions = _get_dialogue_positions(filename) if cache else _dialogue_positions(dial_bunch)
+            positions = sorted(dial_positions[dial_id] for dial_id in return_only if dial_id in dial_positions)
+        for dial_idx in positions:
+            yield filename, dial_bunch[dial_idx]
 
     else:
         for dial in dial_bunch:
             yield filename, dial
 
 
+def field_iterator(filename: str, field: str) -> Iterator:
+    """Yields the value of the top-level key `field` (e.g., ``'dialogue_id'``) of each dialogue in
+    `filename`. If ``ijson`` is installed, the file is stream-parsed so that the turns and annotations
+    of the dialogues are not decoded into Python objects.
+    """
+
+    if ijson is None:
+        for dial in _read_json(filename):
+            yield dial[field]
+    else:
+        with open(filename, 'rb') as f:
+            yield from ijson.items(f, f'item.{field}')
+
+
+def _prefetch(fn: Callable, items: List, window: int = _PREFETCH_WINDOW) -> Iterator:
+    """Yields `fn(item)` for each element of `items`, in order. Up to `window` outputs are computed
+    ahead in background threads while the caller consumes the current one, so that several file
+    reads are in flight while the current file is processed.
+    """
+
+    with ThreadPoolExecutor(max_workers=window) as executor:
+        futures = deque()
+        for item in items:
+            futures.append(executor.submit(fn, item))
+            if len(futures) > window:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
 def split_iterator(split: Literal['train', 'test', 'dev'], return_only: Optional[Set[str]] = None) -> Tuple[str, Dict]:
 
     # return specified dialogues only
     if return_only:
         file_map = get_file_map(list(return_only), split)
         for filename, dial_ids in file_map.items():
-            yield from file_iterator(filename, return_only=set(dial_ids))
-    # iterate through all dialogues
+            yield from file_iterator(filename, return_only=set(dial_ids), stream=True)
+    # iterate through all dialogues. The files are not cached, so only the files read ahead are in memory
     else:
-        for fp in get_filenames(split):
-            with open(fp, 'r') as f:
-                dial_bunch = json.load(f)
+        filenames = get_filenames(split)
+        for fp, dial_bunch in zip(filenames, _prefetch(_read_json, filenames)):
             for dial in dial_bunch:
                 yield fp, dial
 
@@ -101,18 +316,74 @@ def corpus_iterator():
         yield from split_iterator(split)
 
 
-def dialogue_iterator(dialogue: dict, user: bool = True, system: bool = True):
+def parallel_map(fn: Callable, items: Iterable, max_workers: Optional[int] = None) -> List:
+    """Applies `fn` to each element of `items` in a pool of processes.
 
-    if (not user) and (not system):
-        raise ValueError("At least a speaker needs to be specified!")
+    Parameters
+    ----------
+    fn
+        A function defined at module level (so that it can be pickled), typically processing a
+        single dialogues file.
+    items
+        Inputs to `fn`, typically filenames.
+    max_workers
+        Number of processes. Defaults to the number of CPUs.
 
-    filter = 'USER' if not user else 'SYSTEM' if not system else ''
+    Returns
+    -------
+    A list with the outputs of `fn`, in the same order as `items`.
+    """
 
-    for turn in dialogue["turns"]:
-        if filter and turn['speaker'] == filter:
-            continue
-        else:
-            yield turn
+    items = list(items)
+    if not items:
+        return []
+    max_workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(items) // (4 * max_workers))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fn, items, chunksize=chunksize))
+
+
+def parallel_corpus_map(fn: Callable,
+                        splits: Optional[List[str]] = None,
+                        max_workers: Optional[int] = None) -> Dict[str, List]:
+    """Applies `fn` to each dialogues file in `splits` in a pool of processes (see `parallel_map`).
+    The files of all splits are processed in a single pool.
+
+    Parameters
+    ----------
+    fn
+        A function defined at module level, which takes the path to a dialogues file. It should
+        return a small summary of the file (e.g., a set of intents or counts) rather than the
+        dialogues, since its output is pickled to be sent back to the parent process.
+    splits
+        Splits to process. Defaults to all splits.
+    max_workers
+        Number of processes. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    A mapping from split name to a list with the outputs of `fn` for the files in that split, in the
+    order returned by `get_filenames`.
+    """
+
+    splits = _SPLIT_NAMES if splits is None else splits
+    filenames = {split: get_filenames(split) for split in splits}
+    outputs = iter(parallel_map(fn, itertools.chain.from_iterable(filenames.values()), max_workers=max_workers))
+    return {split: list(itertools.islice(outputs, len(split_files))) for split, split_files in filenames.items()}
+
+
+def dialogue_iterator(dialogue: dict, user: bool = True, system: bool = True) -> Iterator[dict]:
+    """Returns an iterator over the turns of `dialogue`, optionally restricted to one speaker. The
+    speaker filter is selected once, so no check is made for each turn when both speakers are included.
+    """
+
+    if user and system:
+        return iter(dialogue["turns"])
+    if user:
+        return (turn for turn in dialogue["turns"] if turn['speaker'] != 'SYSTEM')
+    if system:
+        return (turn for turn in dialogue["turns"] if turn['speaker'] != 'USER')
+    raise ValueError("At least a speaker needs to be specified!")
 
 
 def actions_iterator(frame: dict, exclude_acts: Optional[List[str]] = None):
@@ -129,9 +400,7 @@ def actions_iterator(frame: dict, exclude_acts: Optional[List[str]] = None):
 
 def schema_iterator(split: Literal['train', 'test', 'dev']) -> dict:
 
-    with open(_SCHEMA_PATHS[split], 'r') as f:
-        schema = json.load(f)
-    for service in schema:
+    for service in _load_schema(split):
         yield service
 
 
@@ -139,23 +408,68 @@ def service_iterator(split: Literal['train', 'test', 'dev']) -> dict:
     raise NotImplementedError
 
 
-def random_sampler(split: Literal['train', 'test', 'dev'], n_samples: int):
+def _random_open(rng: np.random.Generator) -> float:
+    """Draws a float uniformly from the open interval (0, 1), so that its logarithm is defined."""
+    while (u := rng.random()) == 0.0:
+        pass
+    return u
+
+
+def random_sampler(split: Literal['train', 'test', 'dev'], n_samples: int, seed: Optional[int] = None):
+    """Samples `n_samples` dialogues uniformly at random (without replacement) from `split`.
+
+    The sampler implements Li's reservoir sampling Algorithm L, which draws random numbers only when
+    the reservoir is updated, skipping over the dialogues in between.
 
+    Parameters
+    ----------
+    split
+        Split to sample from.
+    n_samples
+        Number of dialogues to sample. All the dialogues are returned if `split` contains fewer.
+    seed
+        Seed for the random number generator.
+
+    Returns
+    -------
+    reservoir
+        A list of ``(filename, dialogue)`` tuples.
+    """
+
+    rng = np.random.default_rng(seed)
     iterator = split_iterator(split)
     reservoir = list(itertools.islice(iterator, n_samples))
+    if not reservoir or len(reservoir) < n_samples:
+        return reservoir
 
-    for idx, elem in enumerate(iterator, n_samples + 1):
-        i = np.random.randint(1, idx + 1)
+    w = math.exp(math.log(_random_open(rng)) / n_samples)
+    while True:
+        skip = math.floor(math.log(_random_open(rng)) / math.log(1 - w))
+        elem = next(itertools.islice(iterator, skip, None), None)
+        if elem is None:
+            return reservoir
+        reservoir[rng.integers(n_samples)] = elem
+        w *= math.exp(math.log(_random_open(rng)) / n_samples)
 
-        if i <= n_samples:
-            reservoir[i - 1] = elem
 
-    return reservoir
+def dial_sort_key(dialogue_id: str) -> Tuple[int, int]:
+    file_idx, _, dial_idx = dialogue_id.partition("_")
+    return int(file_idx), int(dial_idx)
 
 
-def dial_sort_key(dialogue_id: str) -> Tuple[int, int]:
-    s1, s2 = dialogue_id.split("_")
-    return int(s1), int(s2)
+def sort_dialogue_ids(dialogue_ids: List[str]) -> List[str]:
+    """Returns `dialogue_ids` in the order given by `dial_sort_key`. The IDs are parsed into an
+    integer array which is sorted with `np.lexsort`, so no key tuple is created for each ID.
+    """
+
+    n_ids = len(dialogue_ids)
+    keys = np.fromiter(
+        (int(part) for dial_id in dialogue_ids for part in dial_id.partition("_")[::2]),
+        dtype=np.int64,
+        count=2 * n_ids,
+    ).reshape(n_ids, 2)
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    return [dialogue_ids[i] for i in order.tolist()]
 
 
 def alphabetical_sort_key(name: str, n_chars: int = 10) -> str:
@@ -163,4 +477,4 @@ def alphabetical_sort_key(name: str, n_chars: int = 10) -> str:
 
 
 def dial_files_sort_key(name: str) -> int:
-    return int(name.split("_")[1].split(".")[0])
+    return int(name.rpartition("_")[2].partition(".")[0])
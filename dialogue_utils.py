@@ -2,10 +2,14 @@
 data from dialogues and training splits. Use in conjunction with the
 information in the `metadata` module.
 """
-from typing import Dict, Set
+from typing import Dict, FrozenSet, Set
 from data_utils import dialogue_iterator
 
+import functools
 import json
+import os
+
+_METADATA_PATH = os.path.join(os.path.dirname(__file__), 'metadata.json')
 
 
 def has_requestables(dialogue: dict) -> bool:
@@ -36,18 +40,13 @@ def get_dialogue_intents(dialogue: Dict, exclude_none: bool = True) -> Set[str]:
         A set of intents contained in the dialogue.
     """
 
-    intents = set()
-    for turn in dialogue_iterator(dialogue, user=True, system=False):
-        for frame in turn['frames']:
-            intent = frame['state']['active_intent']
-            if exclude_none:
-                if intent == 'NONE':
-                    continue
-                else:
-                    intents.add(intent)
-            else:
-                intents.add(intent)
-    return intents
+    excluded = 'NONE' if exclude_none else None
+    return {
+        intent
+        for turn in dialogue_iterator(dialogue, user=True, system=False)
+        for frame in turn['frames']
+        if (intent := frame['state']['active_intent']) != excluded
+    }
 
 
 def offers_entities(dialogue: dict) -> bool:
@@ -56,9 +55,12 @@ def offers_entities(dialogue: dict) -> bool:
     contains at least a search intent.
     """
 
-    intents = get_dialogue_intents(dialogue, exclude_none=True)
-    with open('metadata.json', 'r') as f:
-        metadata = json.load(f)
-    search_intents = set(metadata['SEARCH_INTENTS'])
-    return any(intent in search_intents for intent in intents)
+    return not get_dialogue_intents(dialogue, exclude_none=True).isdisjoint(_get_search_intents())
+
 
+@functools.lru_cache(maxsize=None)
+def _get_search_intents() -> FrozenSet[str]:
+    """Reads the search intents from the metadata file on first use."""
+    with open(_METADATA_PATH, 'r') as f:
+        metadata = json.load(f)
+    return frozenset(metadata['SEARCH_INTENTS'])
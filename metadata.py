@@ -4,137 +4,223 @@ It should only be used to load metadata so that is is available to other
 external modules and should not be imported from by other modules in this
 repository (to avoid circular imports when external modules use the library).
 Instead, modules should load the metadata file directly.
+
+The constants derived from ``metadata.json`` are loaded lazily, on first access.
+The file is parsed and its values are cast to the types of the constants in a single
+pass, and the result is cached next to it in pickle format. The cache is invalidated
+when the modification time of the .json file changes. If the file is missing or
+corrupt, the constants are empty.
+
+Attributes
+----------
+VERSION : str
+    The commit hash of the state of the repo which was used to generate the metadata.
+SERVICES_TO_FILES : Dict[str, Dict[str, List[str]]]
+    Nested mapping with files where different services can be found::
+
+        {
+        'split_name': {'service_name': List[str], of filenames }
+        }
+
+ALL_INTENTS : Set[str]
+    Set of all the intents in the corpus.
+SEARCH_INTENTS : Set[str]
+    Set of all the intents which return entities following an API call (e.g., restaurants,
+    calendar appointment).
+INTENTS_BY_SPLIT : Dict[str, Set[str]]
+    Mapping of split names to the intents called in dialogues found in that split.
+TRANSACTIONAL_INTENTS : Set[str]
+    Set of all the intents that are called in order to execute a transaction (e.g., booking,
+    adding event to a calendar)
+INTENTS_TO_SERVICES : Dict[str, Dict[str, Set[str]]]
+    A mapping with the following structure::
+
+            {
+            'split':{
+                'intent_1': ['Service_1']
+                `intent_2': ['Service_1', 'Service_2']
+            }
+
+REQUESTABLE_SLOTS : Set[str]
+    Set of slots that the user requests. These represent entity attributes (e.g., address,
+    pets allowed).
+BINARY_SLOTS : Set[str]
+    Set of slots which take only ``True`` and ``False`` or ``'0'`` and ``'1'`` values. These
+    slots are not delexicalised in the original corpus.
+BINARY_SLOTS_BY_SERVICE : Dict[str, Set[str]]
+    Mapping of service names to binary slots. The union of all the values yields `BINARY_SLOTS`
+CATEGORICAL_SLOTS : Set[str]
+    Set of slots which take a finite number of values.
+CATEGORICAL_SLOTS_BY_SERVICE : Dict[str, Set[str]]
+    Mapping of service names to categorical slots.
+ENTITY_SLOTS_BY_SERVICE : Dict[str, Dict[str, Set[str]]]
+    Mapping with slots mentioned by the system when a successful call is made to a search/query intent.
+    Format is::
+
+        {
+            'service_name': {'intent_name': {'slot_name', ...}}
+        }
+
+TRANSACTIONAL_DIALOGUES : Dict[str, Set[str]]
+    Mapping of split name to a set dialogue ids of dialogues that are comprised only of transactional intents.
+SEARCH_DIALOGUES : Dict[str, Set[str]]
+    Mapping of split names to dialogue ids of dialogues that are comprised only of search intents.
+MIXED_INTENT_DIALOGUES : Dict[str, Set[str]]
+    Mapping of split names to dialogue ids of dialogues that are comprised only of search intents.
+MULTIPLE_SERVICES_DIALOGUES : Dict[str, Set[str]]
+    Mapping of split names to dialogue ids of dialogues that have multiple services.
 """
 
-from typing import Dict, List, Set
+from typing import Callable, Dict, List, Optional, Set
 
-import collections
 import json
 import os
 import logging
+import pickle
+import tempfile
 
 directory = os.path.dirname(__file__)
 metadata_path = os.path.join(directory, 'metadata.json')
-
-try:
-    with open(metadata_path, 'r') as f:
-        _metadata = json.load(f)  # type: dict
-except (FileNotFoundError, json.decoder.JSONDecodeError):
-    logging.warning("No metadata file detected for corpus or metadata file corrupt.")
-    _metadata = collections.defaultdict(lambda: '')
+_cache_path = f"{metadata_path}.pkl"
+# incremented when the format of the cached metadata changes
+_CACHE_VERSION = 1
+
+_metadata: Optional[dict] = None
+
+
+def _load_metadata() -> dict:
+    """Loads ``metadata.json``, from the pickle cache if it is up to date. The values of the returned
+    dictionary are already cast by `_cast_metadata`.
+    """
+
+    try:
+        mtime = os.stat(metadata_path).st_mtime_ns
+    except FileNotFoundError:
+        logging.warning("No metadata file detected for corpus or metadata file corrupt.")
+        return _cast_metadata({})
+    try:
+        with open(_cache_path, 'rb') as f:
+            cache_version, cached_mtime, metadata = pickle.load(f)
+        if cache_version == _CACHE_VERSION and cached_mtime == mtime:
+            return metadata
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        pass
+    try:
+        with open(metadata_path, 'r') as f:
+            metadata = _cast_metadata(json.load(f))
+    except json.decoder.JSONDecodeError:
+        logging.warning("No metadata file detected for corpus or metadata file corrupt.")
+        return _cast_metadata({})
+    _write_cache(mtime, metadata)
+    return metadata
+
+
+def _write_cache(mtime: int, metadata: dict):
+    """Pickles `metadata` to the cache file. The cache is written to a temporary file which then replaces
+    the cache, so that processes importing the module concurrently never read a partially written cache.
+    The cache is an optimisation, so failing to write it (e.g., read-only install) is not an error.
+    """
+
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(_cache_path), prefix=f"{os.path.basename(_cache_path)}.")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((_CACHE_VERSION, mtime, metadata), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, _cache_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _cast_metadata(metadata: dict) -> dict:
+    """Casts the values of the parsed metadata file to the types of the constants in `_LAZY`, visiting each
+    value once. Keys missing from the file (e.g., if it was generated by an older version) map to empty values.
+
+    Note that this cannot be done with an ``object_hook`` during decoding, since the hook does not know where a
+    list is nested and the file lists in ``SERVICES_TO_FILES`` must not be converted to sets.
+    """
+    return {name: transform(metadata.get(name)) for name, transform in _LAZY.items()}
 
 
 def cast_vals_to_set(d: dict) -> dict:
     """Maps the values of a nested dictionary to a set of strings."""
 
-    for key, value in d.items():
-        if isinstance(value, dict):
-            cast_vals_to_set(value)
-        else:
-            d[key] = set(value)
+    stack = [d]
+    while stack:
+        current = stack.pop()
+        for key, value in current.items():
+            if isinstance(value, dict):
+                stack.append(value)
+            elif not isinstance(value, set):
+                current[key] = set(value)
     return d
 
 
-VERSION = _metadata['VERSION']
-"""
-The commit hash of the state of the repo which was used to generate the metadata.
-"""
-
-SPLIT_NAMES = ['train', 'dev', 'test']
-"""Names of the splits in the corpus. Used by analysis functions for iterations a
-cross splits or the entire corpus.
-"""  # type: List[str]
-
-SCHEMA_PATHS = {split: f"{directory}/{split}/schema.json" for split in SPLIT_NAMES}
-"""Mapping with paths to the schema .json files, for each split. See metadata.SPLIT_NAMES
-for key values.
-"""  # type: Dict[str, str]
-
-SERVICES_TO_FILES = _metadata['SERVICES_TO_FILES']
-"""Nested mapping with files where different services can be found::
-
-    {
-    'split_name': {'service_name': List[str], of filenames }
-    }
-"""  # type: Dict[str, Dict[str, List[str]]]
-
-ALL_INTENTS = set(_metadata['ALL_INTENTS']) if _metadata['ALL_INTENTS'] else set()
-"""Set of all the intents in the corpus.
-"""  # type: Set[str]
+def _to_set(value: Optional[List[str]]) -> Set[str]:
+    return set(value) if value else set()
 
-SEARCH_INTENTS = set(_metadata['SEARCH_INTENTS']) if _metadata['SEARCH_INTENTS'] else set()
-"""Set of all the intents which return entities following an API call (e.g., restaurants,
-calendar appointment).
-"""  # type: Set[str]
 
-INTENTS_BY_SPLIT = cast_vals_to_set(_metadata['INTENTS_BY_SPLIT']) if _metadata['INTENTS_BY_SPLIT'] else {}
-"""Mapping of split names to the intents called in dialogues found in that split.
-"""  # type: Dict[str, Set[str]]
+def _to_nested_set(value: Optional[dict]) -> dict:
+    return cast_vals_to_set(value) if value else {}
 
-TRANSACTIONAL_INTENTS = set(_metadata['TRANSACTIONAL_INTENTS']) if _metadata['TRANSACTIONAL_INTENTS'] else set()
-"""Set of all the intents that are called in order to execute a transaction (e.g., booking,
-adding event to a calendar)
-"""  # type: Set[str]
 
-INTENTS_TO_SERVICES = cast_vals_to_set(_metadata['INTENTS_TO_SERVICES']) if _metadata['INTENTS_TO_SERVICES'] else {}
-"""A mapping with the following structure::
-
-            {
-            'split':{
-                'intent_1': ['Service_1']
-                `intent_2': ['Service_1', 'Service_2']
-            }
-"""  # type: Dict[str, Dict[str, Set[str]]]
+def _to_str(value: Optional[str]) -> str:
+    return value if value else ''
 
-REQUESTABLE_SLOTS = set(_metadata['REQUESTABLE_SLOTS']) if _metadata['REQUESTABLE_SLOTS'] else set()
-"""Set of slots that the user requests. These represent entity attributes (e.g., address,
-pets allowed).
-"""  # type: Set[str]
 
-BINARY_SLOTS = set(_metadata['BINARY_SLOTS']) if _metadata['BINARY_SLOTS'] else set()
-"""Set of slots which take only ``True`` and ``False`` or ``'0'`` and ``'1'`` values. These
-slots are not delexicalised in the original corpus.
-"""  # type: Set[str]
+def _to_dict(value: Optional[dict]) -> dict:
+    return value if value else {}
 
-_binary_by_service = _metadata['BINARY_SLOTS_BY_SERVICE']
-BINARY_SLOTS_BY_SERVICE = cast_vals_to_set(_binary_by_service) if _binary_by_service else {}
-"""Mapping of service names to binary slots. The union of all the values yields `BINARY_SLOTS`
-"""  # type: Dict[str, Set[str]]
 
-CATEGORICAL_SLOTS = set(_metadata['CATEGORICAL_SLOTS']) if _metadata['CATEGORICAL_SLOTS'] else set()
-"""Set of slots which take a finite number of values.
-"""  # type: Set[str]
+SPLIT_NAMES: List[str] = ['train', 'dev', 'test']
+"""Names of the splits in the corpus. Used by analysis functions for iterations a
+cross splits or the entire corpus.
+"""
 
-_categorical_by_service = _metadata['CATEGORICAL_SLOTS_BY_SERVICE']
-CATEGORICAL_SLOTS_BY_SERVICE = cast_vals_to_set(_categorical_by_service) if _categorical_by_service else {}
+SCHEMA_PATHS: Dict[str, str] = {split: f"{directory}/{split}/schema.json" for split in SPLIT_NAMES}
+"""Mapping with paths to the schema .json files, for each split. See metadata.SPLIT_NAMES
+for key values.
 """
-Mapping of service names to categorical slots.
-"""  # type: Dict[str, Set[str]]
-
-_entity_by_service = _metadata['ENTITY_SLOTS_BY_SERVICE']
-ENTITY_SLOTS_BY_SERVICE = cast_vals_to_set(_entity_by_service) if _entity_by_service else {}
-"""Mapping with slots mentioned by the system when a successful call is made to a search/query intent. Format is::
-
-    {
-        'service_name': {'intent_name': {'slot_name', ...}}
-    }
-"""  # type: Dict[str, Dict[str, Set[str]]]
-
-_transactional_dialogues = _metadata['TRANSACTIONAL_DIALOGUES']
-TRANSACTIONAL_DIALOGUES = cast_vals_to_set(_transactional_dialogues) if _transactional_dialogues else {}
-"""Mapping of split name to a set dialogue ids of dialogues that are comprised only of transactional intents.
-"""  # type: Dict[str, Set[str]]
-
-SEARCH_DIALOGUES = cast_vals_to_set(_metadata['SEARCH_DIALOGUES']) if _metadata['SEARCH_DIALOGUES'] else {}
-"""Mapping of split names to dialogue ids of dialogues that are comprised only of search intents.
-"""  # type: Dict[str, Set[str]]
-
-_mixed_intent_dialogues = _metadata['MIXED_INTENT_DIALOGUES']
-MIXED_INTENT_DIALOGUES = cast_vals_to_set(_mixed_intent_dialogues) if _mixed_intent_dialogues else {}
-"""Mapping of split names to dialogue ids of dialogues that are comprised only of search intents.
-"""  # type: Dict[str, Set[str]]
-
-_multiple_service_dialogues = _metadata['MULTIPLE_SERVICES_DIALOGUES']
-MULTIPLE_SERVICES_DIALOGUES = cast_vals_to_set(_multiple_service_dialogues) if _multiple_service_dialogues else {}
-"""Mapping of split names to dialogue ids of dialogues that have multiple services.
-"""  # type: Dict[str, Set[str]]
+
+_LAZY: Dict[str, Callable] = {
+    'VERSION': _to_str,
+    'SERVICES_TO_FILES': _to_dict,
+    'ALL_INTENTS': _to_set,
+    'SEARCH_INTENTS': _to_set,
+    'INTENTS_BY_SPLIT': _to_nested_set,
+    'TRANSACTIONAL_INTENTS': _to_set,
+    'INTENTS_TO_SERVICES': _to_nested_set,
+    'REQUESTABLE_SLOTS': _to_set,
+    'BINARY_SLOTS': _to_set,
+    'BINARY_SLOTS_BY_SERVICE': _to_nested_set,
+    'CATEGORICAL_SLOTS': _to_set,
+    'CATEGORICAL_SLOTS_BY_SERVICE': _to_nested_set,
+    'ENTITY_SLOTS_BY_SERVICE': _to_nested_set,
+    'TRANSACTIONAL_DIALOGUES': _to_nested_set,
+    'SEARCH_DIALOGUES': _to_nested_set,
+    'MIXED_INTENT_DIALOGUES': _to_nested_set,
+    'MULTIPLE_SERVICES_DIALOGUES': _to_nested_set,
+}
+"""Maps the names of the constants loaded from ``metadata.json`` to the functions that cast their values."""
+
+__all__ = ['SPLIT_NAMES', 'SCHEMA_PATHS', 'cast_vals_to_set', *_LAZY]
+
+
+def __getattr__(name: str):
+    """Loads the constants in `_LAZY` on first access and memoizes them in the module namespace."""
+
+    global _metadata
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _metadata is None:
+        _metadata = _load_metadata()
+    value = globals()[name] = _metadata[name]
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY))
@@ -1,6 +1,7 @@
 from typing import Dict, List
 
 import json
+import sys
 
 import numpy as np
 
@@ -30,8 +31,9 @@ def print_dialogue(dialogue: Dict):
     dialogue
         See `get_dialogue_outline` for structure.
     """
-    for i, turn in enumerate(get_utterances(dialogue)):
-        print(f"{i + 1}: {turn}")
+    write = sys.stdout.write
+    for i, turn in enumerate(dialogue['turns'], start=1):
+        write(f"{i}: {turn['utterance']}\n")
 
 
 def get_actions(turn: Dict) -> List[str]:
@@ -105,20 +107,12 @@ def get_actions(turn: Dict) -> List[str]:
     if len(turn['frames']) > 1:
         raise IndexError("Found a more than one frame per turn!")
 
-    actions = turn['frames'][0]['actions']
-    formated_actions = []
-    for d in actions:
-        # acts without parameters (e.g., goodbye)
-        slot = d['slot'] if d['slot'] else ''
-        val = ''
-        if slot:
-            val = ' '.join(d['values']) if d['values'] else ''
-
-        if slot and val:
-            formated_actions.append(f"{d['act']}({slot}={val})")
-        else:
-            formated_actions.append(f"{d['act']}({slot})")
-    return formated_actions
+    # acts without parameters (e.g., goodbye) have an empty slot, and requests have a slot but no values
+    return [
+        f"{d['act']}({slot}={val})" if (slot := d['slot'] or '') and (val := ' '.join(d['values'] or ()))
+        else f"{d['act']}({slot})"
+        for d in turn['frames'][0]['actions']
+    ]
 
 
 def print_turn_outline(outline: List[str]):
@@ -11,6 +11,10 @@ INSTALL_REQUIRES =[
           'typing-extensions>=3.7.4.3',
 ]
 
+EXTRAS_REQUIRE = {
+    'fast': ['orjson>=3.5.0', 'numba>=0.53.0', 'ijson>=3.1'],
+}
+
 setup(name='sgd',
       author='Alexandru Coca',
       author_email='ac2123@cam.ac.uk',
@@ -21,5 +25,6 @@ setup(name='sgd',
       include_package_data=True,
       python_requires='>=3.8',
       install_requires=INSTALL_REQUIRES,
+      extras_require=EXTRAS_REQUIRE,
       test_suite='tests',
       zip_safe=False)
@@ -0,0 +1,106 @@
+from data_utils import (
+    dial_files_sort_key,
+    dial_sort_key,
+    file_iterator,
+    random_sampler,
+    reconstruct_filename,
+    sort_dialogue_ids,
+)
+
+import data_utils
+import json
+import pytest
+
+
+@pytest.mark.parametrize(
+    'dial_id, expected',
+    [
+        ('1_00000', 'dialogues_001.json'),
+        ('12_00034', 'dialogues_012.json'),
+        ('127_00101', 'dialogues_127.json'),
+    ],
+)
+def test_reconstruct_filename(dial_id, expected):
+    assert reconstruct_filename(dial_id) == expected
+
+
+@pytest.mark.parametrize(
+    'name, expected',
+    [
+        ('dialogues_001.json', 1),
+        ('train/dialogues_012.json', 12),
+        ('/data/sgd_corpus/dev/dialogues_127.json', 127),
+    ],
+)
+def test_dial_files_sort_key(name, expected):
+    assert dial_files_sort_key(name) == expected
+
+
+@pytest.mark.parametrize(
+    'dialogue_id, expected',
+    [
+        ('1_00000', (1, 0)),
+        ('12_00034', (12, 34)),
+        ('127_00101', (127, 101)),
+    ],
+)
+def test_dial_sort_key(dialogue_id, expected):
+    assert dial_sort_key(dialogue_id) == expected
+
+
+@pytest.mark.parametrize(
+    'dialogue_ids',
+    [
+        [],
+        ['2_00001'],
+        ['12_00000', '2_00010', '2_00002', '1_00100', '12_00003'],
+    ],
+)
+def test_sort_dialogue_ids(dialogue_ids):
+    assert sort_dialogue_ids(dialogue_ids) == sorted(dialogue_ids, key=dial_sort_key)
+
+
+# number of items in the split `random_sampler` draws from
+n_items = 50
+
+
+@pytest.fixture
+def fake_split(monkeypatch):
+    monkeypatch.setattr(data_utils, 'split_iterator', lambda split: iter(range(n_items)))
+
+
+@pytest.mark.parametrize('n_samples', [1, 10, n_items - 1], ids='n_samples={}'.format)
+@pytest.mark.parametrize('seed', [0, 1, 2], ids='seed={}'.format)
+def test_random_sampler(fake_split, n_samples, seed):
+
+    samples = random_sampler('train', n_samples, seed=seed)
+    assert len(samples) == n_samples
+    assert len(set(samples)) == n_samples
+    assert set(samples).issubset(range(n_items))
+    assert random_sampler('train', n_samples, seed=seed) == samples
+
+
+@pytest.mark.parametrize('n_samples', [n_items, n_items + 10], ids='n_samples={}'.format)
+def test_random_sampler_small_split(fake_split, n_samples):
+    assert random_sampler('train', n_samples, seed=0) == list(range(n_items))
+
+
+def test_random_sampler_no_samples(fake_split):
+    assert random_sampler('train', 0, seed=0) == []
+
+
+@pytest.fixture
+def dialogues_file(tmp_path):
+    filename = tmp_path / 'dialogues_001.json'
+    with open(filename, 'w') as f:
+        json.dump([{'dialogue_id': '1_00000', 'services': [], 'turns': [{'speaker': 'USER', 'frames': []}]}], f)
+    return str(filename)
+
+
+@pytest.mark.parametrize('cache, n_turns', [(False, 1), (True, 0)], ids='cache={}'.format)
+def test_file_iterator_cache(dialogues_file, cache, n_turns):
+
+    _, dialogue = next(file_iterator(dialogues_file, cache=cache))
+    dialogue['turns'].clear()
+    _, dialogue = next(file_iterator(dialogues_file, cache=cache))
+    assert len(dialogue['turns']) == n_turns
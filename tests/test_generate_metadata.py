@@ -1,13 +1,32 @@
 from _generate_metadata import (
+    _dialogue_intent_flags_loop,
+    _dialogue_intent_flags_numpy,
+    _filter_file_by_intent_type,
+    _get_dialogue_intent_flags,
+    _get_file_dialogues_by_type,
+    _get_file_entity_slots,
+    _get_file_requestables,
+    _scan_file,
     get_intents_by_type,
     get_schema_intents,
     filter_by_intent_type,
-    get_entity_slots_map
+    get_dialogues_by_type,
+    get_entity_slots_map,
+    get_file_services,
+    get_multiple_services_dialogues,
+    get_requestable_slots,
+    get_service_to_file_map,
+    scan_corpus,
 )
 from .test_utils import count_intents, get_random_split
-from data_utils import random_sampler, dialogue_iterator
+from data_utils import random_sampler, dialogue_iterator, field_iterator
+from itertools import chain
 
+import copy
+import json
 import metadata
+import numpy as np
+import os
 import pytest
 import random
 
@@ -45,13 +64,13 @@ def test_filter_by_intent_types(transactional, search, n_dialogues, split):
 
     # select `n_dialogues` of each dialog type at random
     transactional_dials = random.sample(
-        metadata.TRANSACTIONAL_DIALOGUES[split],
+        sorted(metadata.TRANSACTIONAL_DIALOGUES[split]),
         min(n_dialogues, len(metadata.TRANSACTIONAL_DIALOGUES[split])))
     search_dials = random.sample(
-        metadata.SEARCH_DIALOGUES[split],
+        sorted(metadata.SEARCH_DIALOGUES[split]),
         min(n_dialogues, len(metadata.SEARCH_DIALOGUES[split])))
     mixed_intent_dials = random.sample(
-        metadata.MIXED_INTENT_DIALOGUES[split],
+        sorted(metadata.MIXED_INTENT_DIALOGUES[split]),
         min(n_dialogues, len(metadata.MIXED_INTENT_DIALOGUES[split])))
 
     if not transactional and not search:
@@ -67,7 +86,7 @@ def test_filter_by_intent_types(transactional, search, n_dialogues, split):
             transactional=transactional,
             search=search
         )
-        all_dials = set().union(*fnames_to_dials.values())
+        all_dials = frozenset(chain.from_iterable(fnames_to_dials.values()))
         if search and not transactional:
             assert set(search_dials).issubset(all_dials)
         elif transactional and not search:
@@ -101,3 +120,118 @@ def test_get_entity_slots_map(n_dialogues, split, trials):
                             expected = expected_output[frame['service']][intent]
                             actual = set(slot_dict['slot'] for slot_dict in frame['slots'])
                             assert not expected - actual
+
+
+SAMPLE_DIALOGUES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_dialogues.json5')
+SAMPLE_TRANSACTIONAL_INTENTS = frozenset(
+    ['ReserveRestaurant', 'BuyBusTicket', 'ReserveCar', 'BookAppointment', 'BuyEventTickets']
+)
+SAMPLE_SEARCH_INTENTS = frozenset(
+    ['SearchOnewayFlight', 'GetCarsAvailable', 'FindProvider', 'FindEvents', 'GetEventDates', 'GetAvailableTime',
+     'FindBus']
+)
+
+
+@pytest.fixture
+def sample_dialogues_file(tmp_path):
+    """Writes the sample dialogues to a file, adding a copy of a search dialogue where the user
+    frames have no active intent and the system mentions no slots.
+    """
+
+    with open(SAMPLE_DIALOGUES, 'r') as f:
+        dialogues = json.load(f)
+    no_intent_dialogue = copy.deepcopy(dialogues[1])
+    no_intent_dialogue['dialogue_id'] = '1_00030'
+    for turn in dialogue_iterator(no_intent_dialogue, user=True, system=False):
+        for frame in turn['frames']:
+            frame['state']['active_intent'] = 'NONE'
+    for turn in dialogue_iterator(no_intent_dialogue, user=False, system=True):
+        for frame in turn['frames']:
+            frame['slots'] = []
+    dialogues.insert(2, no_intent_dialogue)
+    filename = tmp_path / 'dialogues_001.json'
+    with open(filename, 'w') as f:
+        json.dump(dialogues, f)
+    return str(filename)
+
+
+# the second case leaves an intent out of both types, so that some dialogues contain intents which are
+# neither transactional nor search intents
+@pytest.mark.parametrize(
+    'transactional_intents, search_intents',
+    [
+        (SAMPLE_TRANSACTIONAL_INTENTS, SAMPLE_SEARCH_INTENTS),
+        (SAMPLE_TRANSACTIONAL_INTENTS, SAMPLE_SEARCH_INTENTS - {'GetAvailableTime'}),
+    ],
+    ids=['all_intents', 'unclassified_intent'],
+)
+def test_scan_file(sample_dialogues_file, transactional_intents, search_intents):
+
+    filename = sample_dialogues_file
+    file_scan = _scan_file(filename, transactional_intents, search_intents)
+
+    assert file_scan.requestable_slots == _get_file_requestables(filename)
+    assert file_scan.dialogues_by_type == _get_file_dialogues_by_type(filename, transactional_intents)
+    assert file_scan.dialogue_ids == list(field_iterator(filename, 'dialogue_id'))
+    assert file_scan.services == get_file_services(filename)
+    # entity slots are extracted from the mixed intent and search only dialogues, see `_get_entity_slots`
+    entity_dialogues = set()
+    for transactional, search in [(True, True), (False, True)]:
+        entity_dialogues.update(
+            _filter_file_by_intent_type(filename, transactional, search, transactional_intents, search_intents)
+        )
+    expected_entity_slots = _get_file_entity_slots(filename, entity_dialogues, search_intents)
+    assert expected_entity_slots
+    assert file_scan.entity_slots == expected_entity_slots
+
+
+def test_scan_corpus():
+
+    intents_by_type = get_intents_by_type()
+    corpus_scan = scan_corpus(intents_by_type)
+
+    assert corpus_scan.requestable_slots == get_requestable_slots()
+    assert corpus_scan.dialogues_by_type == get_dialogues_by_type(intents_by_type)
+    assert corpus_scan.entity_slots == get_entity_slots_map()
+    assert corpus_scan.multiple_services_dialogues == get_multiple_services_dialogues()
+    assert corpus_scan.services_to_files == get_service_to_file_map()
+
+
+def _get_intent_flags_kernel(kernel: str):
+    if kernel == 'loop':
+        return _dialogue_intent_flags_loop
+    elif kernel == 'numpy':
+        return _dialogue_intent_flags_numpy
+    pytest.importorskip('numba')
+    return _get_dialogue_intent_flags()
+
+
+# intent vocabulary is ['NONE', transactional, search, neither transactional nor search]
+INTENT_FLAGS_CASES = {
+    'mixed': ([0, 0, 1, 1, 2, 3], [1, 2, 0, 0, 2, 3], 5, [
+        [True, True, True],
+        [False, False, False],
+        [False, True, False],
+        [False, True, True],
+        [False, False, False],
+    ]),
+    'none_only': ([0, 0, 0], [0, 0, 0], 1, [[False, False, False]]),
+    'no_frames': ([], [], 2, [[False, False, False], [False, False, False]]),
+}
+
+
+@pytest.mark.parametrize('kernel', ['loop', 'numpy', 'numba'])
+@pytest.mark.parametrize('case', list(INTENT_FLAGS_CASES))
+def test_dialogue_intent_flags(kernel, case):
+
+    dialogue_idx, intent_ids, n_dialogues, expected = INTENT_FLAGS_CASES[case]
+    flags = _get_intent_flags_kernel(kernel)(
+        np.array(dialogue_idx, dtype=np.int64),
+        np.array(intent_ids, dtype=np.int32),
+        np.array([True, False, False, False], dtype=np.bool_),
+        np.array([False, True, False, False], dtype=np.bool_),
+        np.array([False, False, True, False], dtype=np.bool_),
+        n_dialogues,
+    )
+    assert flags.dtype == np.bool_
+    assert flags.tolist() == expected
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import importlib.util
+import json
+import os
+import shutil
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+
+
+def load_metadata_module(directory: Path):
+    """Executes a fresh copy of the `metadata` module which reads the metadata file in `directory`."""
+    spec = importlib.util.spec_from_file_location('_metadata_under_test', directory / 'metadata.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def metadata_dir(tmp_path):
+    shutil.copy(REPO_DIR / 'metadata.py', tmp_path)
+    shutil.copy(REPO_DIR / 'metadata.json', tmp_path)
+    return tmp_path
+
+
+def test_constants_are_loaded_lazily(metadata_dir):
+
+    with open(metadata_dir / 'metadata.json', 'r') as f:
+        expected = json.load(f)
+    module = load_metadata_module(metadata_dir)
+    assert 'ALL_INTENTS' not in vars(module)
+    assert 'ALL_INTENTS' in dir(module)
+
+    assert module.ALL_INTENTS == set(expected['ALL_INTENTS'])
+    assert 'ALL_INTENTS' in vars(module)
+    assert module.VERSION == expected['VERSION']
+    for split, intents in expected['INTENTS_BY_SPLIT'].items():
+        assert module.INTENTS_BY_SPLIT[split] == set(intents)
+    # file lists are not converted to sets
+    assert module.SERVICES_TO_FILES == expected['SERVICES_TO_FILES']
+    with pytest.raises(AttributeError):
+        _ = module.NOT_A_CONSTANT
+
+
+def test_cache_is_used_if_metadata_file_is_unchanged(metadata_dir):
+
+    metadata_path = metadata_dir / 'metadata.json'
+    expected = load_metadata_module(metadata_dir).ALL_INTENTS
+    assert (metadata_dir / 'metadata.json.pkl').exists()
+    # the temporary file the cache is written to is moved in place
+    assert not list(metadata_dir.glob('metadata.json.pkl.*'))
+
+    # corrupt the metadata file without changing its modification time, so it is only readable from the cache
+    stat = os.stat(metadata_path)
+    metadata_path.write_text('corrupt')
+    os.utime(metadata_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert load_metadata_module(metadata_dir).ALL_INTENTS == expected
+
+
+def test_cache_is_rebuilt_if_metadata_file_changes(metadata_dir):
+
+    metadata_path = metadata_dir / 'metadata.json'
+    assert load_metadata_module(metadata_dir).ALL_INTENTS
+
+    stat = os.stat(metadata_path)
+    metadata_path.write_text(json.dumps({'ALL_INTENTS': ['NewIntent']}))
+    os.utime(metadata_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    module = load_metadata_module(metadata_dir)
+    assert module.ALL_INTENTS == {'NewIntent'}
+    # keys missing from the file map to empty values
+    assert module.SEARCH_INTENTS == set()
+    assert load_metadata_module(metadata_dir).ALL_INTENTS == {'NewIntent'}
+
+
+def test_missing_metadata_file(metadata_dir):
+
+    os.remove(metadata_dir / 'metadata.json')
+    module = load_metadata_module(metadata_dir)
+
+    assert module.VERSION == ''
+    assert module.ALL_INTENTS == set()
+    assert module.SERVICES_TO_FILES == {}
+    assert module.TRANSACTIONAL_DIALOGUES == {}
+    assert not (metadata_dir / 'metadata.json.pkl').exists()
@@ -0,0 +1,16 @@
+from print_utils import get_actions
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    'action, expected',
+    [
+        ({'act': 'GOODBYE', 'slot': '', 'values': []}, 'GOODBYE()'),
+        ({'act': 'REQUEST', 'slot': 'street_address', 'values': []}, 'REQUEST(street_address)'),
+        ({'act': 'REQUEST', 'slot': 'street_address', 'values': None}, 'REQUEST(street_address)'),
+        ({'act': 'INFORM', 'slot': 'city', 'values': ['San', 'Jose']}, 'INFORM(city=San Jose)'),
+    ],
+)
+def test_get_actions(action, expected):
+    assert get_actions({'frames': [{'actions': [action]}]}) == [expected]